@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+Benchmark a blog listing page: full-row select vs Blog.__select__ (content deferred) vs columns projection.
+
+MySQL不一定有，这里用sqlite代替：sql完全是orm生成的，比较的是每页返回的数据量和查询耗时。
+'''
+
+import os, sys, time, sqlite3, asyncio, types
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'www'))
+
+# orm.py用的是@asyncio.coroutine，Python 3.11已经删掉了:
+if not hasattr(asyncio, 'coroutine'):
+    asyncio.coroutine = types.coroutine
+
+from orm import select_sql
+from models import Blog, next_id
+
+ROWS = 1000
+CONTENT_SIZE = 20 * 1024
+PAGE_SIZE = 10
+REPEAT = 500
+
+def create_db():
+    conn = sqlite3.connect(':memory:')
+    cols = [Blog.__primary_key__] + Blog.__fields__
+    conn.execute('create table `blogs` (%s)' % ', '.join(map(lambda c: '`%s`' % c, cols)))
+    conn.execute('create index `idx_created_at` on `blogs` (`created_at`)')
+    for n in range(ROWS):
+        b = dict(id=next_id(), user_id=next_id(), user_name='user%s' % n, user_image='http://example.com/%s.png' % n,
+                 name='blog %s' % n, summary='s' * 200, content='c' * CONTENT_SIZE, created_at=time.time() + n)
+        conn.execute('insert into `blogs` (%s) values (%s)' % (', '.join(cols), ', '.join('?' * len(cols))), [b[c] for c in cols])
+    return conn
+
+#估算驱动需要传输和解码的字节数
+def payload(rs):
+    return sum(len(str(v).encode('utf-8')) for r in rs for v in r)
+
+def bench(conn, title, select):
+    sql = '%s order by `created_at` desc limit ?' % select
+    rs = conn.execute(sql, [PAGE_SIZE]).fetchall()
+    start = time.perf_counter()
+    for n in range(REPEAT):
+        conn.execute(sql, [PAGE_SIZE]).fetchall()
+    elapsed = (time.perf_counter() - start) / REPEAT
+    print('%-30s %10d bytes/page %10.1f us/page' % (title, payload(rs), elapsed * 1000000))
+
+if __name__ == '__main__':
+    conn = create_db()
+    print('%s rows, %s bytes content, %s rows per page' % (ROWS, CONTENT_SIZE, PAGE_SIZE))
+    bench(conn, 'full row', select_sql(Blog.__table__, Blog.__primary_key__, Blog.__fields__))
+    bench(conn, 'Blog.__select__ (deferred)', Blog.__select__)
+    bench(conn, 'columns=[name, summary, ...]', Blog.get_select(['name', 'summary', 'created_at']))
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+Benchmark memory of a large multipart upload: parse_body vs aiohttp request.post().
+
+每种方式在单独的进程里跑，这样ru_maxrss就是这一种方式的峰值RSS；tracemalloc只统计上传期间Python分配的内存峰值。
+'''
+
+import os, sys, time, asyncio, resource, subprocess, tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'www'))
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer, TestClient
+
+from coroweb import parse_body, close_files
+
+SIZE = 64 * 1024 * 1024
+CHUNK = 64 * 1024
+
+#客户端按块生成multipart请求体，客户端这边不占多少内存
+async def body():
+    yield b'--b\r\nContent-Disposition: form-data; name="file"; filename="big.bin"\r\n\r\n'
+    chunk = b'x' * CHUNK
+    for n in range(SIZE // CHUNK):
+        yield chunk
+    yield b'\r\n--b--\r\n'
+
+async def handle_parse_body(request):
+    data = await parse_body(request, SIZE * 2)
+    close_files(data)
+    return web.Response(text='ok')
+
+async def handle_post(request):
+    data = await request.post()
+    for v in data.values():
+        if isinstance(v, web.FileField):
+            v.file.close()
+    return web.Response(text='ok')
+
+async def run(mode):
+    app = web.Application(client_max_size=SIZE * 2)
+    app.router.add_post('/', handle_parse_body if mode == 'parse_body' else handle_post)
+    async with TestClient(TestServer(app)) as client:
+        tracemalloc.start()
+        start = time.perf_counter()
+        resp = await client.post('/', data=body(), headers={'Content-Type': 'multipart/form-data; boundary=b'})
+        assert resp.status == 200, resp.status
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024
+    print('%-12s tracemalloc peak %8.1f MB, max rss %5d MB, %6.2f s' % (mode, peak / 1024 / 1024, rss, elapsed))
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        asyncio.run(run(sys.argv[1]))
+    else:
+        print('upload %s MB' % (SIZE // 1024 // 1024))
+        for mode in ('parse_body', 'post'):
+            subprocess.check_call([sys.executable, os.path.abspath(__file__), mode])
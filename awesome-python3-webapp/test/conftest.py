@@ -0,0 +1,10 @@
+# -*- coding: utf-8 -*-
+
+import os, sys, asyncio, types
+
+# www下的模块都是用import orm这样的平级方式导入的:
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'www'))
+
+# orm.py用的是@asyncio.coroutine，Python 3.11已经删掉了，测试时用types.coroutine顶上:
+if not hasattr(asyncio, 'coroutine'):
+    asyncio.coroutine = types.coroutine
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+
+import asyncio, base64
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer, TestClient, make_mocked_request
+
+import coroweb
+from coroweb import post, add_route, parse_body, RequestHandler, MAX_PARTS
+from app import logger_factory, data_factory, response_factory
+
+def echo(kw):
+    return web.json_response(dict((k, v if isinstance(v, str) else v.file.read().decode('utf-8')) for k, v in kw.items()))
+
+@post('/api/echo', max_body=100)
+async def api_echo(**kw):
+    return echo(kw)
+
+@post('/api/upload')
+async def api_upload(**kw):
+    return echo(kw)
+
+@post('/api/data', max_body=100)
+async def api_data(**kw):
+    return echo(kw)
+
+def request(method, path, middlewares=(), **kw):
+    async def main():
+        app = web.Application(middlewares=middlewares)
+        add_route(app, api_data)
+        add_route(app, api_echo)
+        add_route(app, api_upload)
+        async with TestClient(TestServer(app)) as client:
+            resp = await client.request(method, path, **kw)
+            return resp.status, await resp.text()
+    return asyncio.run(main())
+
+def test_json_body():
+    assert request('POST', '/api/echo', json=dict(name='a')) == (200, '{"name": "a"}')
+
+def test_too_large_by_content_length():
+    status, _ = request('POST', '/api/echo', data=b'x' * 200, headers={'Content-Type': 'application/json'})
+    assert status == 413
+
+def test_too_large_chunked():
+    async def gen():
+        for n in range(10):
+            yield b'x' * 50
+    status, _ = request('POST', '/api/echo', data=gen(), headers={'Content-Type': 'application/x-www-form-urlencoded'})
+    assert status == 413
+
+def multipart(*parts):
+    body = b''
+    for headers, value in parts:
+        body += b'--b\r\n' + b''.join(h.encode() + b'\r\n' for h in headers) + b'\r\n' + value + b'\r\n'
+    return body + b'--b--\r\n'
+
+def test_multipart_parts_are_decoded():
+    body = multipart(
+        (['Content-Disposition: form-data; name="f"; filename="f.txt"', 'Content-Transfer-Encoding: base64'], base64.b64encode(b'hello')),
+        (['Content-Disposition: form-data; name="t"'], b'world'))
+    status, text = request('POST', '/api/upload', data=body, headers={'Content-Type': 'multipart/form-data; boundary=b'})
+    assert (status, text) == (200, '{"f": "hello", "t": "world"}')
+
+def test_nested_multipart_is_rejected():
+    body = multipart((['Content-Disposition: form-data; name="n"', 'Content-Type: multipart/mixed; boundary=c'], b'--c--'))
+    status, _ = request('POST', '/api/upload', data=body, headers={'Content-Type': 'multipart/form-data; boundary=b'})
+    assert status == 400
+
+def test_parse_body_is_cached():
+    async def main():
+        req = make_mocked_request('POST', '/api/echo', headers={'Content-Type': 'application/json'})
+        req['__data__'] = dict(name='a')
+        # 有缓存时不会再去读body(mocked request的body是空的，读的话会解析失败):
+        return await parse_body(req), await parse_body(req)
+    first, second = asyncio.run(main())
+    assert first == dict(name='a') and first is second
+
+# 没有Content-Length，part内容都是空的，只有头和boundary，也要按实际读到的字节数限制；
+# part数少于MAX_PARTS时只能靠字节数拦住:
+@pytest.mark.parametrize('parts', [MAX_PARTS // 2, 20000])
+def test_chunked_multipart_counts_part_headers(parts):
+    async def gen():
+        for n in range(parts):
+            yield b'--b\r\nContent-Disposition: form-data; name="f%s"; filename=""\r\n\r\n\r\n' % str(n).encode()
+        yield b'--b--\r\n'
+    status, _ = request('POST', '/api/echo', data=gen(), headers={'Content-Type': 'multipart/form-data; boundary=b'})
+    assert status == 413
+
+def test_too_many_parts():
+    body = multipart(*[(['Content-Disposition: form-data; name="f%s"' % n], b'') for n in range(MAX_PARTS + 1)])
+    status, _ = request('POST', '/api/upload', data=body, headers={'Content-Type': 'multipart/form-data; boundary=b'})
+    assert status == 413
+
+def test_unnamed_part_is_rejected():
+    body = multipart((['Content-Disposition: form-data; filename="f.txt"'], b'hello'))
+    status, _ = request('POST', '/api/upload', data=body, headers={'Content-Type': 'multipart/form-data; boundary=b'})
+    assert status == 400
+
+def test_unknown_charset_is_rejected():
+    status, _ = request('POST', '/api/echo', data=b'{}', headers={'Content-Type': 'application/json; charset=bogus'})
+    assert status == 400
+    status, _ = request('POST', '/api/echo', data=b'a=1', headers={'Content-Type': 'application/x-www-form-urlencoded; charset=bogus'})
+    assert status == 400
+
+# 安装app.py里的middleware，统计body实际被读了几次、URL处理函数被调用了几次:
+def count_calls(monkeypatch):
+    calls = dict(read_body=0, handle=0)
+    read_body, handle = coroweb.read_body, RequestHandler.handle
+    async def counted_read_body(*args):
+        calls['read_body'] += 1
+        return (await read_body(*args))
+    async def counted_handle(self, request):
+        calls['handle'] += 1
+        return (await handle(self, request))
+    monkeypatch.setattr(coroweb, 'read_body', counted_read_body)
+    monkeypatch.setattr(RequestHandler, 'handle', counted_handle)
+    return calls
+
+MIDDLEWARES = [logger_factory, data_factory, response_factory]
+
+def test_data_factory_parses_once(monkeypatch):
+    calls = count_calls(monkeypatch)
+    status, text = request('POST', '/api/data', MIDDLEWARES, json=dict(name='a'))
+    assert (status, text) == (200, '{"name": "a"}')
+    assert calls == dict(read_body=1, handle=1)
+
+def test_data_factory_applies_route_max_body(monkeypatch):
+    calls = count_calls(monkeypatch)
+    status, _ = request('POST', '/api/data', MIDDLEWARES, json=dict(name='a' * 200))
+    assert status == 413
+    assert calls == dict(read_body=0, handle=0)
+    async def gen():
+        for n in range(10):
+            yield b'x' * 50
+    status, _ = request('POST', '/api/data', MIDDLEWARES, data=gen(), headers={'Content-Type': 'application/json'})
+    assert status == 413
+    assert calls == dict(read_body=1, handle=0)
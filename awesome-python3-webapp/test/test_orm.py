@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+
+import asyncio, sqlite3
+
+import pytest
+
+import orm
+from orm import Model, StringField, TextField, FloatField
+
+class Post(Model):
+    __table__ = 'posts'
+
+    id = StringField(primary_key=True, ddl='varchar(50)')
+    name = StringField(ddl='varchar(50)')
+    summary = StringField(ddl='varchar(200)')
+    content = TextField(deferred=True)
+    created_at = FloatField()
+
+# 用sqlite代替MySQL执行orm生成的sql，sqlite也认?占位符和`反引号`:
+@pytest.fixture
+def db(monkeypatch):
+    conn = sqlite3.connect(':memory:')
+    conn.row_factory = lambda cur, row: dict((d[0], v) for d, v in zip(cur.description, row))
+    conn.execute('create table posts (id text primary key, name text, summary text, content text, created_at real)')
+    for n in range(3):
+        conn.execute('insert into posts values (?, ?, ?, ?, ?)', ['p%s' % n, 'name%s' % n, 'summary%s' % n, 'content%s' % n, n])
+    sqls = []
+    async def select(sql, args, size=None):
+        sqls.append(sql)
+        rs = conn.execute(sql, args).fetchall()
+        return rs[:size] if size else rs
+    monkeypatch.setattr(orm, 'select', select)
+    return sqls
+
+def run(coro):
+    async def main():
+        return await coro
+    return asyncio.run(main())
+
+def test_get_select():
+    assert Post.__deferred__ == ['content']
+    assert Post.__select__ == 'select `id`, `name`, `summary`, `created_at` from `posts`'
+    assert Post.get_select(['name']) == 'select `id`, `name` from `posts`'
+    with pytest.raises(ValueError):
+        Post.get_select(['nothing'])
+
+def test_find_all_columns(db):
+    args = []
+    posts = run(Post.find_all(args=args, columns=['name'], orderBy='created_at desc', limit=2))
+    assert args == []
+    assert db == ['select `id`, `name` from `posts` order by created_at desc limit ?']
+    assert posts == [dict(id='p2', name='name2'), dict(id='p1', name='name1')]
+    with pytest.raises(AttributeError):
+        posts[0].summary
+
+def test_deferred_field_not_loaded(db):
+    post = run(Post.find('p0'))
+    assert post.summary == 'summary0'
+    assert 'content' not in post
+    with pytest.raises(AttributeError):
+        post.content
+    run(post.load())
+    assert post.content == 'content0'
+
+def test_load_all_in_one_query(db):
+    posts = run(Post.find_all(orderBy='created_at'))
+    other = Post(id='p1')
+    del db[:]
+    run(Post.load_all(posts + [other], 'content'))
+    assert len(db) == 1
+    assert [p.content for p in posts] == ['content0', 'content1', 'content2']
+    assert other.content == 'content1'
+
+# EXPLAIN检查用的假连接池，方法都是生成器，和orm里的yield from配合：
+# where条件带主键的走索引(const)，其余都是全表扫描(ALL)
+class ExplainCursor(object):
+
+    def __init__(self):
+        self.sql = None
+
+    def execute(self, sql, args):
+        yield from ()
+        self.sql = sql
+
+    def fetchall(self):
+        yield from ()
+        if self.sql.startswith('explain '):
+            return [dict(table='posts', type='const' if 'where `id`' in self.sql else 'ALL')]
+        return []
+
+    def fetchmany(self, size):
+        yield from ()
+        return []
+
+    def close(self):
+        yield from ()
+
+class ExplainConnection(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def cursor(self, cls=None):
+        yield from ()
+        return ExplainCursor()
+
+class ExplainPool(object):
+
+    def __iter__(self):
+        yield from ()
+        return ExplainConnection()
+
+@pytest.fixture
+def explain_pool(monkeypatch):
+    monkeypatch.setattr(orm, '__pool', ExplainPool(), raising=False)
+    yield
+    orm.set_explain(False)
+
+def test_explain_records_full_scans(explain_pool):
+    orm.set_explain()
+    run(orm.select('%s where `id`=?' % Post.__select__, ['p0'], 1))
+    assert orm.get_full_scans() == []
+    run(orm.select('%s where `name`=?' % Post.__select__, ['name0']))
+    assert orm.get_full_scans() == ['%s where `name`=?' % Post.__select__]
+    orm.set_explain()
+    assert orm.get_full_scans() == []
+
+def test_explain_disabled(explain_pool):
+    orm.set_explain(False)
+    run(orm.select(Post.__select__, []))
+    assert orm.get_full_scans() == []
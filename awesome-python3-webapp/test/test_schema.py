@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+
+from orm import Model, StringField, IntegerField, FloatField
+import schema
+
+class Item(Model):
+    __table__ = 'items'
+    __indexes__ = ['created_at', ('user_id', 'created_at')]
+
+    id = StringField(primary_key=True, ddl='varchar(50)')
+    user_id = StringField(ddl='varchar(50)', index=True)
+    count = IntegerField()
+    created_at = FloatField(index=True)
+
+def test_indexes_are_not_duplicated():
+    assert sorted(Item.__indexes__) == [('created_at',), ('user_id',), ('user_id', 'created_at')]
+    sql = schema.create_table_sql(Item)
+    assert sql.count('key `idx_created_at`') == 1
+
+def test_diff_adds_missing_columns_and_indexes():
+    L = schema.diff_sql(Item, {'id': 'varchar(50)', 'user_id': 'varchar(50)'}, {'PRIMARY'})
+    assert 'alter table `items` add column `count` bigint not null;' in L
+    assert 'alter table `items` add column `created_at` real not null;' in L
+    assert 'create index `idx_user_id_created_at` on `items` (`user_id`, `created_at`);' in L
+
+def test_diff_reports_mismatches_as_comments():
+    columns = {'id': 'varchar(50)', 'user_id': 'varchar(100)', 'count': 'bigint(20)', 'created_at': 'double', 'old': 'int(11)'}
+    indexes = {'PRIMARY', 'idx_user_id', 'idx_created_at', 'idx_user_id_created_at', 'idx_old'}
+    L = schema.diff_sql(Item, columns, indexes)
+    assert L == [
+        '-- `items`.`user_id` is varchar(100) in database but varchar(50) in model',
+        '-- `items`.`old` is in database but not in model',
+        '-- index `idx_old` on `items` is in database but not in model'
+    ]
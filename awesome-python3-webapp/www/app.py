@@ -16,7 +16,7 @@ from aiohttp import web
 from jinja2 import Environment, FileSystemLoader
 
 import orm
-from coroweb import add_routes,add_static
+from coroweb import add_routes,add_static,parse_body,RequestHandler
 
 #这个函数应该是配置响应模板的环境。
 def init_jinja2(app, **kw):
@@ -58,15 +58,15 @@ async def logger_factory(app, handler):
         return (await handler(request))
     return logger
 
+#只对注册过的URL处理函数解析body，解析结果缓存在request里，RequestHandler不会再读第二次
 async def data_factory(app, handler):
     async def parse_data(request):
-        if request.method == 'POST':
-            if request.content_type.startswith('application/json'):
-                request.__data__ = await request.json()
-                logging.info('request json: %s' % str(request.__data__))
-            elif request.content_type.startswith('application/x-www-form-urlencoded'):
-                request.__data__ = await request.post()
-                logging.info('request form: %s' % str(request.__data__))
+        # RequestHandler实例不是协程函数，aiohttp会用functools.wraps包一层，要取__wrapped__:
+        route_handler = request.match_info.handler
+        route_handler = getattr(route_handler, '__wrapped__', route_handler)
+        if request.method == 'POST' and isinstance(route_handler, RequestHandler):
+            data = await parse_body(request, route_handler._max_body)
+            logging.info('request data: %s' % str(data))
         return (await handler(request))
     return parse_data
 
@@ -135,7 +135,7 @@ async def init(loop):
     await orm.create_pool(loop=loop, host='127.0.0.1', port=3306, user='guixingniu', password='Woshishen112358', db='awesome')
     #我们可以将 WSGI Middleware 了理解为 Server 和 Application 交互的一层包装，经过不同的 Middleware ，便拥有了不同的功能，EG. URL 路由转发、权限认证。因为Middleware能过处理所有通过的 request 和 response，所以要做什么都可以，没有限制。比如可以检查 request 是否有非法内容，检查 response 是否有非法内容，为 request 加上特定的 HTTP header 等
     app = web.Application(middlewares=[
-        logger_factory, response_factory
+        logger_factory, data_factory, response_factory
     ])
     #响应模板的环境（在哪加载模板等等）,这个datetime应该是python里的玩意，还有一种写法  init_jinja2(app,filters=dict(datetime=datetime_filter),path = r"E:\python\workspace\awesome-python3-webapp\www\templates")#初始化Jinja2，这里值得注意是设置文件路径的path参数
     init_jinja2(app, filters=dict(datetime=datetime_filter))#这个filters参数不知道是啥。删了也可以运行
@@ -147,6 +147,7 @@ async def init(loop):
     logging.info('server started at http://127.0.0.1:9000...')
     return srv
 
-loop = asyncio.get_event_loop()
-loop.run_until_complete(init(loop))
-loop.run_forever()
\ No newline at end of file
+if __name__ == '__main__':
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(init(loop))
+    loop.run_forever()
\ No newline at end of file
@@ -3,7 +3,7 @@
 
 __author__ = 'Michael Liao'
 
-import asyncio, os, inspect, logging, functools
+import asyncio, os, inspect, logging, functools, json, tempfile
 
 from urllib import parse
 
@@ -26,9 +26,10 @@ def get(path):
     return decorator
 
 #自定义装饰器，给func赋予了method和route属性。实际上是个处理url的函数，赋予了其url的属性“post”和“path”（分析输入浏览器请求的属性）
-def post(path):
+#max_body是该路由允许的最大请求体字节数，不传就用MAX_BODY
+def post(path, max_body=None):
     '''
-    Define decorator @post('/path')
+    Define decorator @post('/path') or @post('/path', max_body=10*1024*1024)
     '''
     def decorator(func):
         @functools.wraps(func)
@@ -36,9 +37,140 @@ def post(path):
             return func(*args, **kw)
         wrapper.__method__ = 'POST'
         wrapper.__route__ = path
+        wrapper.__max_body__ = max_body
         return wrapper
     return decorator
 
+# 默认的请求体大小上限:
+MAX_BODY = 1024 * 1024
+# multipart每次读取的块大小，块太小的话每块一次线程池写文件，开销很大:
+PART_CHUNK = 256 * 1024
+# multipart最多允许的part数，每个文件part都要开一个临时文件:
+MAX_PARTS = 100
+
+def too_large(max_body, size):
+    return web.HTTPRequestEntityTooLarge(max_size=max_body, actual_size=size)
+
+#multipart的大小限制按从请求里实际读到的字节数算(包括part的头和boundary)，解码后的大小也不能超过
+def check_size(stream, max_body, size=0):
+    if stream.total_bytes > max_body:
+        raise too_large(max_body, stream.total_bytes)
+    if size > max_body:
+        raise too_large(max_body, size)
+
+#字符集不认识或者内容解码不了都是客户端的问题，返回400
+def decode_text(data, charset):
+    try:
+        return data.decode(charset)
+    except (ValueError, LookupError):
+        raise web.HTTPBadRequest(text='Cannot decode body as %s.' % charset)
+
+#按块读取请求体，超过上限立刻返回413，不会把整个超大body读进内存
+async def read_body(stream, max_body):
+    body = bytearray()
+    while True:
+        chunk = await stream.readany()
+        if not chunk:
+            break
+        body.extend(chunk)
+        if len(body) > max_body:
+            raise too_large(max_body, len(body))
+    return bytes(body)
+
+#关闭请求体里上传文件对应的临时文件
+def close_files(data):
+    if isinstance(data, dict):
+        for v in data.values():
+            if isinstance(v, web.FileField):
+                v.file.close()
+
+#读取一个part，先按Content-Transfer-Encoding/Content-Encoding解码再计数，write为None时返回读到的bytes
+async def read_part(part, stream, max_body, size, write=None):
+    value = bytearray()
+    while True:
+        chunk = await part.read_chunk(PART_CHUNK)
+        check_size(stream, max_body)
+        if not chunk:
+            break
+        chunk = part.decode(chunk)
+        size += len(chunk)
+        check_size(stream, max_body, size)
+        if write is None:
+            value.extend(chunk)
+        else:
+            await write(chunk)
+    return size, bytes(value)
+
+#multipart里的文件直接按块写到临时文件，普通字段才读进内存
+#写临时文件是阻塞的磁盘IO，放到线程池里执行，不阻塞事件循环
+async def read_parts(request, max_body, data):
+    loop = asyncio.get_event_loop()
+    stream = request.content
+    size = 0
+    parts = 0
+    reader = await request.multipart()
+    while True:
+        part = await reader.next()
+        check_size(stream, max_body, size)
+        if part is None:
+            break
+        parts += 1
+        if parts > MAX_PARTS:
+            raise web.HTTPRequestEntityTooLarge(max_size=max_body, actual_size=stream.total_bytes, text='Too many parts, max %s.' % MAX_PARTS)
+        if not hasattr(part, 'filename'):
+            raise web.HTTPBadRequest(text='Nested multipart is not supported.')
+        if not part.name:
+            raise web.HTTPBadRequest(text='Multipart field missing name.')
+        # 同名的part后面的覆盖前面的，被覆盖的临时文件先关掉:
+        close_files({part.name: data.pop(part.name, None)})
+        if part.filename:
+            f = await loop.run_in_executor(None, tempfile.TemporaryFile)
+            data[part.name] = web.FileField(part.name, part.filename, f, part.headers.get('Content-Type'), part.headers)
+            async def write(chunk, f=f):
+                await loop.run_in_executor(None, f.write, chunk)
+            size, _ = await read_part(part, stream, max_body, size, write)
+            await loop.run_in_executor(None, f.seek, 0)
+        else:
+            size, value = await read_part(part, stream, max_body, size)
+            data[part.name] = decode_text(value, part.get_charset('utf-8'))
+
+async def read_multipart(request, max_body):
+    data = dict()
+    try:
+        await read_parts(request, max_body, data)
+    except BaseException:
+        # 413/400等出错时，已经写好的临时文件要马上关掉:
+        close_files(data)
+        raise
+    return data
+
+#解析请求体，结果缓存在request['__data__']里，data_factory和RequestHandler都调用它，但body只读一次
+#上传的文件是web.FileField，临时文件在URL处理函数返回后由RequestHandler关闭，需要保留的话请在处理函数里复制
+async def parse_body(request, max_body=MAX_BODY):
+    if '__data__' in request:
+        return request['__data__']
+    data = None
+    if request.method == 'POST' and request.content_type:
+        # 有Content-Length的话，超过上限不用读body直接拒绝:
+        if request.content_length is not None and request.content_length > max_body:
+            raise too_large(max_body, request.content_length)
+        ct = request.content_type.lower()
+        if ct.startswith('application/json'):
+            body = await read_body(request.content, max_body)
+            try:
+                data = json.loads(decode_text(body, request.charset or 'utf-8'))
+            except ValueError:
+                raise web.HTTPBadRequest(text='Invalid JSON body.')
+        elif ct.startswith('application/x-www-form-urlencoded'):
+            body = await read_body(request.content, max_body)
+            data = dict()
+            for k, v in parse.parse_qs(decode_text(body, request.charset or 'utf-8'), True).items():
+                data[k] = v[0]
+        elif ct.startswith('multipart/form-data'):
+            data = await read_multipart(request, max_body)
+    request['__data__'] = data
+    return data
+
 def get_required_kw_args(fn):
     args = []
     params = inspect.signature(fn).parameters
@@ -92,8 +224,15 @@ class RequestHandler(object):
         self._has_named_kw_args = has_named_kw_args(fn)
         self._named_kw_args = get_named_kw_args(fn)
         self._required_kw_args = get_required_kw_args(fn)
+        self._max_body = getattr(fn, '__max_body__', None) or MAX_BODY
 
     async def __call__(self, request):
+        try:
+            return (await self.handle(request))
+        finally:
+            close_files(request.get('__data__'))
+
+    async def handle(self, request):
         kw = None
         if self._has_var_kw_arg or self._has_named_kw_args or self._required_kw_args:
             if request.method == 'POST':
@@ -101,12 +240,12 @@ class RequestHandler(object):
                     return web.HTTPBadRequest('Missing Content-Type.')
                 ct = request.content_type.lower()
                 if ct.startswith('application/json'):
-                    params = await request.json()
+                    params = await parse_body(request, self._max_body)
                     if not isinstance(params, dict):
                         return web.HTTPBadRequest('JSON body must be object.')
-                    kw = params
+                    kw = dict(params)
                 elif ct.startswith('application/x-www-form-urlencoded') or ct.startswith('multipart/form-data'):
-                    params = await request.post()
+                    params = await parse_body(request, self._max_body)
                     kw = dict(**params)
                 else:
                     return web.HTTPBadRequest('Unsupported Content-Type: %s' % request.content_type)
@@ -37,12 +37,12 @@ class User(Model):
     __table__ = 'users'
 
     id = StringField(primary_key=True, default=next_id, ddl='varchar(50)')
-    email = StringField(ddl='varchar(50)')
+    email = StringField(ddl='varchar(50)', index=True)
     passwd = StringField(ddl='varchar(50)')
     admin = BooleanField()
     name = StringField(ddl='varchar(50)')
     image = StringField(ddl='varchar(500)')
-    created_at = FloatField(default=time.time)
+    created_at = FloatField(default=time.time, index=True)
 
 class Blog(Model):
     __table__ = 'blogs'
@@ -53,11 +53,14 @@ class Blog(Model):
     user_image = StringField(ddl='varchar(500)')
     name = StringField(ddl='varchar(50)')
     summary = StringField(ddl='varchar(200)')
-    content = TextField()
-    created_at = FloatField(default=time.time)
+    # 列表页只显示name和summary，content等到详情页再load
+    content = TextField(deferred=True)
+    created_at = FloatField(default=time.time, index=True)
 
 class Comment(Model):
     __table__ = 'comments'
+    # 按blog_id取评论并按时间排序，用组合索引避免全表扫描和filesort
+    __indexes__ = [('blog_id', 'created_at')]
 
     id = StringField(primary_key=True, default=next_id, ddl='varchar(50)')
     blog_id = StringField(ddl='varchar(50)')
@@ -65,4 +68,4 @@ class Comment(Model):
     user_name = StringField(ddl='varchar(50)')
     user_image = StringField(ddl='varchar(500)')
     content = TextField()
-    created_at = FloatField(default=time.time)
\ No newline at end of file
+    created_at = FloatField(default=time.time, index=True)
\ No newline at end of file
@@ -8,6 +8,32 @@ import logging; logging.basicConfig(level=logging.INFO)
 def log(sql, args=()):
     logging.info('SQL: %s' % sql)
 
+#测试模式开关：打开后每条select都会先执行EXPLAIN，检查是否全表扫描
+__explain = False
+#记录被判定为全表扫描的sql语句
+__full_scans = []
+
+def set_explain(enabled=True):
+    ' enable or disable EXPLAIN checking of every select (test mode). '
+    global __explain
+    __explain = enabled
+    del __full_scans[:]
+
+def get_full_scans():
+    ' return the select statements flagged as full table scans. '
+    return list(__full_scans)
+
+#EXPLAIN结果中type为ALL表示全表扫描，说明where/order by的列上缺索引
+@asyncio.coroutine
+def explain(cur, sql, args):
+    yield from cur.execute('explain ' + sql.replace('?', '%s'), args or ())
+    rs = yield from cur.fetchall()
+    for r in rs:
+        if r.get('type') == 'ALL':
+            logging.warning('full table scan on `%s`: %s' % (r.get('table'), sql))
+            __full_scans.append(sql)
+            break
+
 @asyncio.coroutine
 def create_pool(loop, **kw):
     logging.info('create database connection pool...')
@@ -25,6 +51,13 @@ def create_pool(loop, **kw):
         minsize=kw.get('minsize', 1),
         loop=loop
     )
+
+@asyncio.coroutine
+def close_pool():
+    logging.info('close database connection pool...')
+    global __pool
+    __pool.close()
+    yield from __pool.wait_closed()
 #下面是select函数
 @asyncio.coroutine
 def select(sql,args,size=None):
@@ -34,6 +67,8 @@ def select(sql,args,size=None):
     with (yield from __pool) as conn:
         #连接数据库，创建游标
         cur = yield from conn.cursor(aiomysql.DictCursor)
+        if __explain:
+            yield from explain(cur, sql, args)
         #这里的replace是将占位符替换为后边的指令和参数
         yield from cur.execute(sql.replace('?', '%s'), args or ())
         if size:
@@ -66,6 +101,9 @@ def execute(sql, args):
         except BaseException as e:
             raise
         return affected
+#构造只取部分列的select语句，主键总是要取的
+def select_sql(table, pk, columns):
+    return 'select %s from `%s`' % (', '.join(map(lambda f: '`%s`' % f, [pk] + [c for c in columns if c != pk])), table)
 #这个元类是model的元类，实现将子类user的映射信息读取出来，相当于实现类的所有方法和属性。任何继承自Model的类（比如User），会自动通过ModelMetaclass扫描映射关系，并存储到自身的类属性如__table__、__mappings__中
 class ModelMetaclass(type):
 
@@ -80,11 +118,19 @@ class ModelMetaclass(type):
         mappings = dict()
         fields = []
         primaryKey = None
+        # 单列索引来自Field(index=True)，组合索引来自__indexes__:
+        indexes = []
+        # deferred的列不出现在默认的SELECT里，需要时再load:
+        deferred = []
         for k, v in attrs.items():
             if isinstance(v, Field):
                 logging.info('  found mapping: %s ==> %s' % (k, v))
                 #为键和键值建立对应关系？？
                 mappings[k] = v
+                if v.index and not v.primary_key:
+                    indexes.append((k,))
+                if v.deferred and not v.primary_key:
+                    deferred.append(k)
                 if v.primary_key:
                     # 找到主键:
                     if primaryKey:
@@ -96,13 +142,24 @@ class ModelMetaclass(type):
             raise RuntimeError('Primary key not found.')
         for k in mappings.keys():
             attrs.pop(k)
+        for cols in attrs.get('__indexes__', ()):
+            if isinstance(cols, str):
+                cols = (cols,)
+            for c in cols:
+                if c not in mappings:
+                    raise RuntimeError('Index column not found: %s' % c)
+            # 已经由index=True声明过的索引不重复添加，否则建表时Duplicate key name:
+            if tuple(cols) not in indexes:
+                indexes.append(tuple(cols))
         escaped_fields = list(map(lambda f: '`%s`' % f, fields))
         attrs['__mappings__'] = mappings # 保存属性和列的映射关系
         attrs['__table__'] = tableName
         attrs['__primary_key__'] = primaryKey # 主键属性名
         attrs['__fields__'] = fields # 除主键外的属性名
+        attrs['__indexes__'] = indexes # 索引，每个索引是一组列名
+        attrs['__deferred__'] = deferred # 延迟加载的属性名
         # 构造默认的SELECT, INSERT, UPDATE和DELETE语句:
-        attrs['__select__'] = 'select `%s`, %s from `%s`' % (primaryKey, ', '.join(escaped_fields), tableName)
+        attrs['__select__'] = select_sql(tableName, primaryKey, [f for f in fields if f not in deferred])
         attrs['__insert__'] = 'insert into `%s` (%s, `%s`) values (%s)' % (tableName, ', '.join(escaped_fields), primaryKey,create_args_string(len(escaped_fields) + 1))
         attrs['__update__'] = 'update `%s` set %s where `%s`=?' % (tableName, ', '.join(map(lambda f: '`%s`=?' % (mappings.get(f).name or f), fields)), primaryKey)
         attrs['__delete__'] = 'delete from `%s` where `%s`=?' % (tableName, primaryKey)
@@ -118,6 +175,8 @@ class Model(dict, metaclass=ModelMetaclass):
         try:
             return self[key]
         except KeyError:
+            if key in self.__mappings__:
+                raise AttributeError(r"'%s' object has not loaded field '%s', use load() first" % (self.__class__.__name__, key))
             raise AttributeError(r"'Model' object has no attribute '%s'" % key)
 
     def __setattr__(self, key, value):
@@ -136,14 +195,70 @@ class Model(dict, metaclass=ModelMetaclass):
                 setattr(self, key, value)
         return value
     @classmethod
+    def get_select(cls, columns=None):
+        # columns为None时用默认的__select__(不含deferred列):
+        if columns is None:
+            return cls.__select__
+        for c in columns:
+            if c not in cls.__mappings__:
+                raise ValueError('Invalid column: %s' % c)
+        return select_sql(cls.__table__, cls.__primary_key__, columns)
+    @classmethod
+    @asyncio.coroutine
+    def find_all(cls, where=None, args=None, columns=None, **kw):
+        ' find objects by where clause, only the given columns are selected if columns is set. '
+        sql = [cls.get_select(columns)]
+        if where:
+            sql.append('where')
+            sql.append(where)
+        # 复制一份，limit的参数不能加到调用者的list里:
+        args = list(args or [])
+        orderBy = kw.get('orderBy', None)
+        if orderBy:
+            sql.append('order by')
+            sql.append(orderBy)
+        limit = kw.get('limit', None)
+        if limit is not None:
+            sql.append('limit')
+            if isinstance(limit, int):
+                sql.append('?')
+                args.append(limit)
+            elif isinstance(limit, tuple) and len(limit) == 2:
+                sql.append('?, ?')
+                args.extend(limit)
+            else:
+                raise ValueError('Invalid limit value: %s' % str(limit))
+        rs = yield from select(' '.join(sql), args)
+        return [cls(**r) for r in rs]
+    @classmethod
     @asyncio.coroutine
-    def find(cls,pk):
+    def find(cls, pk, columns=None):
         #为uesr类添加索引方法
         ' find object by primary key. '
-        rs = yield from select('%s where `%s`=?' % (cls.__select__, cls.__primary_key__), [pk], 1)
+        rs = yield from select('%s where `%s`=?' % (cls.get_select(columns), cls.__primary_key__), [pk], 1)
         if len(rs) == 0:
             return None
         return cls(**rs[0])
+    @classmethod
+    @asyncio.coroutine
+    def load_all(cls, objs, *names):
+        ' load deferred (or not selected) fields for a list of objects in one query. '
+        if not names:
+            names = [k for k in cls.__fields__ if any(k not in o for o in objs)]
+        # 不同的对象可能有相同的主键，所以主键对应的是一个list:
+        pks = dict()
+        for o in objs:
+            pks.setdefault(o[cls.__primary_key__], []).append(o)
+        if not names or not pks:
+            return
+        rs = yield from select('%s where `%s` in (%s)' % (cls.get_select(names), cls.__primary_key__, create_args_string(len(pks))), list(pks.keys()))
+        for r in rs:
+            for o in pks[r[cls.__primary_key__]]:
+                o.update(r)
+    @asyncio.coroutine
+    def load(self, *names):
+        ' load deferred (or not selected) fields of this object. '
+        yield from self.__class__.load_all([self], *names)
     @asyncio.coroutine
     def save(self):
         #user类的save方法
@@ -156,22 +271,39 @@ class Model(dict, metaclass=ModelMetaclass):
 #Field基类
 class Field(object):
 
-    def __init__(self, name, column_type, primary_key, default):
+    def __init__(self, name, column_type, primary_key, default, index=False, deferred=False):
         self.name = name
         self.column_type = column_type
         self.primary_key = primary_key
         self.default = default
+        self.index = index
+        self.deferred = deferred
 
     def __str__(self):
         return '<%s, %s:%s>' % (self.__class__.__name__, self.column_type, self.name)
-#下面两个都是field的子类
+#下面都是field的子类
 class StringField(Field):
     #varchar是可变长度的char，规定了最大长度
 
-    def __init__(self, name=None, primary_key=False, default=None, ddl='varchar(100)'):
-        super().__init__(name, ddl, primary_key, default)
+    def __init__(self, name=None, primary_key=False, default=None, ddl='varchar(100)', index=False, deferred=False):
+        super().__init__(name, ddl, primary_key, default, index, deferred)
+
+class BooleanField(Field):
+
+    def __init__(self, name=None, default=False, index=False):
+        super().__init__(name, 'boolean', False, default, index)
 
 class IntegerField(Field):
 
-    def __init__(self, name=None, primary_key=False, default=0, ddl='bigint'):
-        super().__init__(name, ddl, primary_key, default)
+    def __init__(self, name=None, primary_key=False, default=0, ddl='bigint', index=False):
+        super().__init__(name, ddl, primary_key, default, index)
+
+class FloatField(Field):
+
+    def __init__(self, name=None, primary_key=False, default=0.0, index=False):
+        super().__init__(name, 'real', primary_key, default, index)
+
+class TextField(Field):
+
+    def __init__(self, name=None, default=None, deferred=False):
+        super().__init__(name, 'mediumtext', False, default, deferred=deferred)
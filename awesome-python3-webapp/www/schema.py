@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+Generate schema DDL and migrations from Model mappings.
+'''
+
+import re
+
+import orm
+from orm import Model
+
+#索引名在同一张表内唯一即可
+def index_name(cols):
+    return 'idx_%s' % '_'.join(cols)
+
+#根据Model的__mappings__生成建表语句，主键放最后，和__insert__的列顺序一致
+def create_table_sql(cls):
+    L = []
+    for k in cls.__fields__:
+        L.append('    `%s` %s not null' % (k, cls.__mappings__[k].column_type))
+    pk = cls.__primary_key__
+    L.append('    `%s` %s not null' % (pk, cls.__mappings__[pk].column_type))
+    for cols in cls.__indexes__:
+        L.append('    key `%s` (%s)' % (index_name(cols), ', '.join(map(lambda c: '`%s`' % c, cols))))
+    L.append('    primary key (`%s`)' % pk)
+    return 'create table `%s` (\n%s\n) engine=innodb default charset=utf8;' % (cls.__table__, ',\n'.join(L))
+
+def create_index_sql(cls, cols):
+    return 'create index `%s` on `%s` (%s);' % (index_name(cols), cls.__table__, ', '.join(map(lambda c: '`%s`' % c, cols)))
+
+# information_schema里的column_type是MySQL规范化之后的写法，比较前先把别名和整数显示宽度统一掉
+_TYPE_ALIASES = {
+    'boolean': 'tinyint(1)',
+    'bool': 'tinyint(1)',
+    'real': 'double',
+    'integer': 'int'
+}
+
+def normalize_type(t):
+    t = t.lower().strip()
+    t = _TYPE_ALIASES.get(t, t)
+    if t != 'tinyint(1)':
+        t = re.sub(r'^(tinyint|smallint|mediumint|int|bigint)\(\d+\)', r'\1', t)
+    return t
+
+#对比数据库里已有的列和索引(columns是列名到column_type的dict，indexes是索引名的集合)
+#只生成补齐缺少的列和索引的语句；类型不一致、数据库里多出来的列和索引只以注释的形式报告，需要手工处理
+def diff_sql(cls, columns, indexes):
+    L = []
+    for k in [cls.__primary_key__] + cls.__fields__:
+        ddl = cls.__mappings__[k].column_type
+        if k not in columns:
+            L.append('alter table `%s` add column `%s` %s not null;' % (cls.__table__, k, ddl))
+        elif normalize_type(columns[k]) != normalize_type(ddl):
+            L.append('-- `%s`.`%s` is %s in database but %s in model' % (cls.__table__, k, columns[k], ddl))
+    for k in sorted(columns):
+        if k not in cls.__mappings__:
+            L.append('-- `%s`.`%s` is in database but not in model' % (cls.__table__, k))
+    names = set()
+    for cols in cls.__indexes__:
+        names.add(index_name(cols))
+        if index_name(cols) not in indexes:
+            L.append(create_index_sql(cls, cols))
+    for name in sorted(indexes):
+        if name != 'PRIMARY' and name not in names:
+            L.append('-- index `%s` on `%s` is in database but not in model' % (name, cls.__table__))
+    return L
+
+#从information_schema读出表结构，表不存在就直接返回建表语句
+async def migrate_sql(cls, db):
+    rs = await orm.select('select `column_name` as `name`, `column_type` as `type` from information_schema.columns where `table_schema`=? and `table_name`=?', [db, cls.__table__])
+    if len(rs) == 0:
+        return [create_table_sql(cls)]
+    columns = dict((r['name'], r['type']) for r in rs)
+    rs = await orm.select('select distinct `index_name` as `name` from information_schema.statistics where `table_schema`=? and `table_name`=?', [db, cls.__table__])
+    indexes = set(r['name'] for r in rs)
+    return diff_sql(cls, columns, indexes)
+
+def get_models(mod):
+    L = []
+    for attr in dir(mod):
+        m = getattr(mod, attr)
+        if isinstance(m, type) and issubclass(m, Model) and m is not Model:
+            L.append(m)
+    return L
+
+async def migrate(loop, models):
+    from config import configs
+    db = configs.db
+    await orm.create_pool(loop=loop, host=db.host, port=db.port, user=db.user, password=db.password, db=db.database)
+    L = []
+    try:
+        for m in models:
+            L.extend(await migrate_sql(m, db.database))
+    finally:
+        await orm.close_pool()
+    return L
+
+if __name__ == '__main__':
+    import sys, asyncio
+    import models
+    # python3 schema.py 输出完整建表语句
+    # python3 schema.py --migrate 输出补齐当前数据库缺少的列和索引的语句，其余差异以注释输出
+    if '--migrate' in sys.argv:
+        loop = asyncio.get_event_loop()
+        for sql in loop.run_until_complete(migrate(loop, get_models(models))):
+            print(sql)
+    else:
+        for m in get_models(models):
+            print(create_table_sql(m))
+            print()